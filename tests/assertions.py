@@ -1,5 +1,7 @@
 from unittest.mock import Mock
 
+import trio
+
 
 def assert_log_message_field_equals(log_message, field_name, value):
     __tracebackhide__ = True
@@ -11,17 +13,6 @@ def assert_log_message_field_equals(log_message, field_name, value):
     ), f"{log_message[field_name]} != {value}"
 
 
-def assert_field_equals_in_any_message(log_messages, field_name, value):
-    __tracebackhide__ = True
-
-    assert any(
-        field_name in log_message and value(log_message[field_name])
-        if callable(value) and not isinstance(value, Mock)
-        else log_message[field_name] == value
-        for log_message in log_messages
-    )
-
-
 def assert_logged_action_succeeded(logged_action):
     __tracebackhide__ = True
 
@@ -36,3 +27,11 @@ def assert_logged_action_failed(logged_action):
     assert_log_message_field_equals(
         logged_action.end_message, "action_status", "failed"
     )
+
+
+async def assert_state_sequence(receive_channel, *expected_states, timeout=1):
+    __tracebackhide__ = True
+
+    with trio.fail_after(timeout * len(expected_states)):
+        for expected_state in expected_states:
+            assert await receive_channel.receive() == expected_state
@@ -1,8 +1,10 @@
-from unittest.mock import call
+import inspect
+from itertools import islice
+from operator import attrgetter
+from unittest.mock import AsyncMock, MagicMock, Mock, call
 
 import pytest
 import trio
-from asynctest import MagicMock, Mock
 from eliot.testing import LoggedAction, LoggedMessage
 
 from bootsteps import AsyncStep, Blueprint
@@ -11,9 +13,20 @@ from tests.assertions import (
     assert_log_message_field_equals,
     assert_logged_action_failed,
     assert_logged_action_succeeded,
-    assert_field_equals_in_any_message
+    assert_state_sequence,
 )
-from tests.mocks import TrioCoroutineMock, create_mock_step, create_start_stop_mock_step
+from tests.mocks import create_mock_step, create_start_stop_mock_step
+
+
+# The expected calls are shared by all the scenarios below so they are only built once
+STEP1_CALL = call.mock_step1()
+STEP2_START_CALL = call.mock_step2.start()
+STEP2_STOP_CALL = call.mock_step2.stop()
+STEP3_CALL = call.mock_step3()
+STEP4_START_CALL = call.mock_step4.start()
+STEP4_STOP_CALL = call.mock_step4.stop()
+STEP5_CALL = call.mock_step5()
+STEP6_CALL = call.mock_step6()
 
 
 @pytest.fixture
@@ -21,505 +34,307 @@ def mock_execution_order_strategy_class():
     return MagicMock(name="ExecutionOrder", spec_set=ExecutionOrder)
 
 
-@pytest.fixture(autouse=True)
-def mock_inspect_isawaitable(mocker):
-    return mocker.patch(
-        "bootsteps.blueprint.inspect.isawaitable",
-        side_effect=lambda o: isinstance(o, TrioCoroutineMock),
-    )
-
-
-def assert_parallelized_steps_are_in_order(
-    actual_execution_order, expected_execution_order
-):
-    __tracebackhide__ = True
-
-    begin = 0
-
-    # Test that all the steps were parallelized in the same order
-    for steps in expected_execution_order:
-        end = begin + len(steps)
-        assert sorted(steps) == sorted(actual_execution_order[begin:end])
-        begin = end
-
-    # Ensure no further calls were made
-    assert not actual_execution_order[begin:]
-
-
-def test_init(bootsteps_graph, mock_execution_order_strategy_class):
-    b = Blueprint(
-        bootsteps_graph,
-        name="Test",
-        execution_order_strategy_class=mock_execution_order_strategy_class,
-    )
-
-    assert b.name == "Test"
-    assert b._steps == bootsteps_graph
-    assert b.state == BlueprintState.INITIALIZED
-    assert b.execution_order_strategy_class == mock_execution_order_strategy_class
-
+@pytest.fixture
+def mock_steps():
+    # AsyncMock awaits its side effects without relying on asyncio so it works
+    # with trio as is. It is MagicMock based though and reset_mock() replaces
+    # __eq__ once it has been used, so the mocks must not be shared between
+    # tests.
+    return {
+        "mock_step1": create_mock_step("step1"),
+        "mock_step2": create_start_stop_mock_step("step2"),
+        "mock_step3": create_mock_step("step3"),
+        "mock_step4": create_start_stop_mock_step("step4", mock_class=AsyncMock),
+        "mock_step5": create_mock_step("step5"),
+        "mock_step6": create_mock_step("step6", spec=AsyncStep, mock_class=AsyncMock),
+    }
 
-async def test_blueprint_start(
-    bootsteps_graph, mock_execution_order_strategy_class, logger
-):
-    mock_step1 = create_mock_step("step1")
-    mock_step2 = create_start_stop_mock_step("step2")
-    mock_step3 = create_mock_step("step3")
-    mock_step4 = create_start_stop_mock_step("step4", mock_class=TrioCoroutineMock)
-    mock_step5 = create_mock_step("step5")
-    mock_step6 = create_mock_step("step6", spec=AsyncStep, mock_class=TrioCoroutineMock)
 
+@pytest.fixture
+def m(mock_steps):
     # We're using a parent mock simply to record the order of calls to different
     # steps
     m = Mock()
-    m.attach_mock(mock_step1, "mock_step1")
-    m.attach_mock(mock_step2, "mock_step2")
-    m.attach_mock(mock_step3, "mock_step3")
-    m.attach_mock(mock_step4, "mock_step4")
-    m.attach_mock(mock_step5, "mock_step5")
-    m.attach_mock(mock_step6, "mock_step6")
-
-    expected_execution_order = [
-        [m.mock_step1, m.mock_step2],
-        [m.mock_step3, m.mock_step4, m.mock_step5],
-        [m.mock_step6],
-    ]
-    mock_iterator = MagicMock()
-    mock_iterator.__iter__.return_value = expected_execution_order
-    mock_execution_order_strategy_class.return_value = mock_iterator
-
-    blueprint = Blueprint(
-        bootsteps_graph,
-        name="Test",
-        execution_order_strategy_class=mock_execution_order_strategy_class,
-    )
-
-    async with trio.open_nursery() as nursery:
-        nursery.start_soon(blueprint.start)
-
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.RUNNING
-            )
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.COMPLETED
-            )
-
-    mock_execution_order_strategy_class.assert_called_once_with(blueprint._steps)
-
-    assert_parallelized_steps_are_in_order(
-        m.method_calls,
-        [
-            [call.mock_step1(), call.mock_step2.start()],
-            [call.mock_step3(), call.mock_step4.start(), call.mock_step5()],
-            [call.mock_step6()],
-        ],
-    )
-
-    mock_step6.assert_awaited_once_with()
-    mock_step4.start.assert_awaited_once_with()
-
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:start")
-    assert len(logged_actions) == 1
-    logged_action = logged_actions[0]
-    assert_log_message_field_equals(logged_action.start_message, "name", blueprint.name)
-    assert_logged_action_succeeded(logged_action)
-
-    messages = LoggedMessage.of_type(
-        logger.messages, "bootsteps:blueprint:next_bootsteps"
-    )
-    assert len(messages) == 3
-
-    assert_log_message_field_equals(messages[0].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[0].message, "next_bootsteps", [m.mock_step1, m.mock_step2]
-    )
-
-    assert_log_message_field_equals(messages[1].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[1].message,
-        "next_bootsteps",
-        [m.mock_step3, m.mock_step4, m.mock_step5],
-    )
-
-    assert_log_message_field_equals(messages[2].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[2].message, "next_bootsteps", [m.mock_step6]
-    )
-
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:executing_bootstep")
-    assert len(logged_actions) == 6
-
-    start_messages = [logged_action.start_message for logged_action in logged_actions]
-
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step1)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step2.start)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step3)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step4.start)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step5)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step6)
+    for name, mock_step in mock_steps.items():
+        m.attach_mock(mock_step, name)
 
-    assert_logged_action_succeeded(logged_actions[0])
-    assert_logged_action_succeeded(logged_actions[1])
-    assert_logged_action_succeeded(logged_actions[2])
-    assert_logged_action_succeeded(logged_actions[3])
-    assert_logged_action_succeeded(logged_actions[4])
-    assert_logged_action_succeeded(logged_actions[5])
+    return m
 
 
-async def test_blueprint_start_failure(
-    bootsteps_graph, mock_execution_order_strategy_class, logger
-):
-    mock_step1 = create_mock_step("step1")
-    mock_step1.side_effect = expected_exception = RuntimeError("Expected Failure")
-    mock_step2 = create_start_stop_mock_step("step2")
-    mock_step3 = create_mock_step("step3")
-    mock_step4 = create_start_stop_mock_step("step4", mock_class=TrioCoroutineMock)
-    mock_step5 = create_mock_step("step5")
-    mock_step6 = create_mock_step("step6", spec=AsyncStep, mock_class=TrioCoroutineMock)
-
-    # We're using a parent mock simply to record the order of calls to different
-    # steps
-    m = Mock()
-    m.attach_mock(mock_step1, "mock_step1")
-    m.attach_mock(mock_step2, "mock_step2")
-    m.attach_mock(mock_step3, "mock_step3")
-    m.attach_mock(mock_step4, "mock_step4")
-    m.attach_mock(mock_step5, "mock_step5")
-    m.attach_mock(mock_step6, "mock_step6")
-
+@pytest.fixture
+def wired_execution_order(mock_execution_order_strategy_class, m):
     expected_execution_order = [
         [m.mock_step1, m.mock_step2],
         [m.mock_step3, m.mock_step4, m.mock_step5],
         [m.mock_step6],
     ]
+    # reversed() returns a one-shot iterator so we hand out a fresh one on every
+    # call to __reversed__
+    reversed_execution_order = expected_execution_order[::-1]
     mock_iterator = MagicMock()
     mock_iterator.__iter__.return_value = expected_execution_order
+    mock_iterator.__reversed__ = Mock(side_effect=lambda: iter(reversed_execution_order))
     mock_execution_order_strategy_class.return_value = mock_iterator
 
-    blueprint = Blueprint(
-        bootsteps_graph,
-        name="Test",
-        execution_order_strategy_class=mock_execution_order_strategy_class,
-    )
-
-    with pytest.raises(RuntimeError):
-        async with trio.open_nursery() as nursery:
-            nursery.start_soon(blueprint.start)
-
-    with trio.fail_after(1):
-        assert (
-            await blueprint.state_changes_receive_channel.receive()
-            == BlueprintState.RUNNING
-        )
-
-    with trio.fail_after(1):
-        assert await blueprint.state_changes_receive_channel.receive() == (
-            BlueprintState.FAILED,
-            expected_exception,
-        )
-
-    mock_execution_order_strategy_class.assert_called_once_with(blueprint._steps)
+    return expected_execution_order
 
-    assert_parallelized_steps_are_in_order(
-        m.method_calls, [[call.mock_step1(), call.mock_step2.start()]]
-    )
-    mock_step3.assert_not_called()
-    mock_step4.start.assert_not_called()
-    mock_step5.assert_not_called()
-    mock_step6.assert_not_called()
 
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:start")
-    assert len(logged_actions) == 1
-    logged_action = logged_actions[0]
-    assert_log_message_field_equals(logged_action.start_message, "name", blueprint.name)
-    assert_logged_action_failed(logged_action)
+@pytest.fixture(scope="module", autouse=True)
+def mock_inspect_isawaitable():
+    # The patch is the same for every test so we install it once per module
+    # instead of paying for mocker.patch() in each test.
+    original_isawaitable = inspect.isawaitable
+    inspect.isawaitable = lambda o: isinstance(o, AsyncMock)
+    try:
+        yield
+    finally:
+        inspect.isawaitable = original_isawaitable
 
-    messages = LoggedMessage.of_type(
-        logger.messages, "bootsteps:blueprint:next_bootsteps"
-    )
-    assert len(messages) == 1
-
-    assert_log_message_field_equals(messages[0].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[0].message, "next_bootsteps", [m.mock_step1, m.mock_step2]
-    )
 
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:executing_bootstep")
-    assert len(logged_actions) == 2
-
-    mock_step1.side_effect = None
-
-    assert_log_message_field_equals(logged_actions[0].start_message, "bootstep", m.mock_step1)
-    assert_logged_action_failed(logged_actions[0])
-
-    assert_log_message_field_equals(logged_actions[1].start_message, "bootstep", m.mock_step2.start)
-    assert_logged_action_succeeded(logged_actions[1])
+def assert_parallelized_steps_are_in_order(
+    actual_execution_order, expected_execution_order
+):
+    __tracebackhide__ = True
 
+    actual_steps = iter(actual_execution_order)
+    calls_count = 0
 
-async def test_blueprint_stop(
-    bootsteps_graph, mock_execution_order_strategy_class, logger
-):
-    mock_step1 = create_mock_step("step1")
-    mock_step2 = create_start_stop_mock_step("step2")
-    mock_step3 = create_mock_step("step3")
-    mock_step4 = create_start_stop_mock_step("step4", mock_class=TrioCoroutineMock)
-    mock_step5 = create_mock_step("step5")
-    mock_step6 = create_mock_step("step6", spec=AsyncStep, mock_class=TrioCoroutineMock)
+    # Test that all the steps were parallelized in the same order
+    for steps in expected_execution_order:
+        assert sorted(steps) == sorted(islice(actual_steps, len(steps)))
+        calls_count += len(steps)
 
-    # We're using a parent mock simply to record the order of calls to different
-    # steps
-    m = Mock()
-    m.attach_mock(mock_step1, "mock_step1")
-    m.attach_mock(mock_step2, "mock_step2")
-    m.attach_mock(mock_step3, "mock_step3")
-    m.attach_mock(mock_step4, "mock_step4")
-    m.attach_mock(mock_step5, "mock_step5")
-    m.attach_mock(mock_step6, "mock_step6")
+    # Ensure no further calls were made
+    assert calls_count == len(actual_execution_order)
 
-    expected_execution_order = [
-        [m.mock_step1, m.mock_step2],
-        [m.mock_step3, m.mock_step4, m.mock_step5],
-        [m.mock_step6],
-    ]
-    mock_iterator = MagicMock()
-    reversed_func = Mock(return_value=reversed(expected_execution_order))
-    mock_iterator.__reversed__ = reversed_func
-    mock_iterator.__iter__.return_value = expected_execution_order
-    mock_execution_order_strategy_class.return_value = mock_iterator
 
-    blueprint = Blueprint(
+def test_init(bootsteps_graph, mock_execution_order_strategy_class):
+    b = Blueprint(
         bootsteps_graph,
         name="Test",
         execution_order_strategy_class=mock_execution_order_strategy_class,
     )
 
-    async with trio.open_nursery() as nursery:
-        nursery.start_soon(blueprint.stop)
-
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.TERMINATING
-            )
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.TERMINATED
-            )
-
-    mock_execution_order_strategy_class.assert_called_once_with(blueprint._steps)
-
-    assert_parallelized_steps_are_in_order(
-        m.method_calls, [[call.mock_step4.stop()], [call.mock_step2.stop()]]
-    )
-
-    mock_step4.stop.assert_awaited_once_with()
-
-    mock_step1.assert_not_called()
-    mock_step3.assert_not_called()
-    mock_step5.assert_not_called()
-    mock_step6.assert_not_called()
-
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:stop")
-    assert len(logged_actions) == 1
-    logged_action = logged_actions[0]
-    assert_log_message_field_equals(logged_action.start_message, "name", blueprint.name)
-    assert_logged_action_succeeded(logged_action)
-
-    messages = LoggedMessage.of_type(
-        logger.messages, "bootsteps:blueprint:next_bootsteps"
-    )
-    assert len(messages) == 2
-
-    assert_log_message_field_equals(messages[0].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[0].message, "next_bootsteps", [m.mock_step4]
-    )
-
-    assert_log_message_field_equals(messages[1].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[1].message,
-        "next_bootsteps",
-        [m.mock_step2],
-    )
-
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:executing_bootstep")
-    assert len(logged_actions) == 2
-
-    start_messages = [logged_action.start_message for logged_action in logged_actions]
-
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step4.stop)
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step2.stop)
-
-    assert_logged_action_succeeded(logged_actions[0])
-    assert_logged_action_succeeded(logged_actions[1])
+    assert b.name == "Test"
+    assert b._steps == bootsteps_graph
+    assert b.state == BlueprintState.INITIALIZED
+    assert b.execution_order_strategy_class == mock_execution_order_strategy_class
 
 
-async def test_blueprint_stop_failure(
-    bootsteps_graph, mock_execution_order_strategy_class, logger
+# Each scenario lists the steps by their attribute path on the parent mock since
+# the mocks themselves are only attached to it once the test runs.
+LIFECYCLE_SCENARIOS = {
+    "start": {
+        "entry_point": "start",
+        "failing_bootstep": None,
+        "expected_states": [[BlueprintState.RUNNING, BlueprintState.COMPLETED]],
+        "expected_calls": [
+            [STEP1_CALL, STEP2_START_CALL],
+            [STEP3_CALL, STEP4_START_CALL, STEP5_CALL],
+            [STEP6_CALL],
+        ],
+        "awaited_bootsteps": ["mock_step6", "mock_step4.start"],
+        "not_called_bootsteps": [],
+        "logged_action_types": ["bootsteps:blueprint:start"],
+        "next_bootsteps": [
+            ["mock_step1", "mock_step2"],
+            ["mock_step3", "mock_step4", "mock_step5"],
+            ["mock_step6"],
+        ],
+        "executed_bootsteps": {
+            "mock_step1": "succeeded",
+            "mock_step2.start": "succeeded",
+            "mock_step3": "succeeded",
+            "mock_step4.start": "succeeded",
+            "mock_step5": "succeeded",
+            "mock_step6": "succeeded",
+        },
+    },
+    "start_failure": {
+        "entry_point": "start",
+        "failing_bootstep": "mock_step1",
+        "expected_states": [[BlueprintState.RUNNING, BlueprintState.FAILED]],
+        "expected_calls": [[STEP1_CALL, STEP2_START_CALL]],
+        "awaited_bootsteps": [],
+        "not_called_bootsteps": [
+            "mock_step3",
+            "mock_step4.start",
+            "mock_step5",
+            "mock_step6",
+        ],
+        "logged_action_types": ["bootsteps:blueprint:start"],
+        "next_bootsteps": [["mock_step1", "mock_step2"]],
+        "executed_bootsteps": {
+            "mock_step1": "failed",
+            "mock_step2.start": "succeeded",
+        },
+    },
+    "stop": {
+        "entry_point": "stop",
+        "failing_bootstep": None,
+        "expected_states": [[BlueprintState.TERMINATING, BlueprintState.TERMINATED]],
+        "expected_calls": [[STEP4_STOP_CALL], [STEP2_STOP_CALL]],
+        "awaited_bootsteps": ["mock_step4.stop"],
+        "not_called_bootsteps": ["mock_step1", "mock_step3", "mock_step5", "mock_step6"],
+        "logged_action_types": ["bootsteps:blueprint:stop"],
+        "next_bootsteps": [["mock_step4"], ["mock_step2"]],
+        "executed_bootsteps": {
+            "mock_step4.stop": "succeeded",
+            "mock_step2.stop": "succeeded",
+        },
+    },
+    "stop_failure": {
+        "entry_point": "stop",
+        "failing_bootstep": "mock_step4.stop",
+        "expected_states": [[BlueprintState.TERMINATING, BlueprintState.FAILED]],
+        "expected_calls": [[STEP4_STOP_CALL]],
+        "awaited_bootsteps": [],
+        "not_called_bootsteps": [
+            "mock_step1",
+            "mock_step2.stop",
+            "mock_step3",
+            "mock_step5",
+            "mock_step6",
+        ],
+        "logged_action_types": ["bootsteps:blueprint:stop"],
+        "next_bootsteps": [["mock_step4"]],
+        "executed_bootsteps": {"mock_step4.stop": "failed"},
+    },
+    "async_context_manager": {
+        "entry_point": "async_context_manager",
+        "failing_bootstep": None,
+        "expected_states": [
+            [BlueprintState.RUNNING, BlueprintState.COMPLETED],
+            [BlueprintState.TERMINATING, BlueprintState.TERMINATED],
+        ],
+        "expected_calls": [
+            [STEP1_CALL, STEP2_START_CALL],
+            [STEP3_CALL, STEP4_START_CALL, STEP5_CALL],
+            [STEP6_CALL],
+            [STEP4_STOP_CALL],
+            [STEP2_STOP_CALL],
+        ],
+        "awaited_bootsteps": ["mock_step6", "mock_step4.start", "mock_step4.stop"],
+        "not_called_bootsteps": [],
+        "logged_action_types": ["bootsteps:blueprint:start", "bootsteps:blueprint:stop"],
+        "next_bootsteps": [
+            ["mock_step1", "mock_step2"],
+            ["mock_step3", "mock_step4", "mock_step5"],
+            ["mock_step6"],
+            ["mock_step4"],
+            ["mock_step2"],
+        ],
+        "executed_bootsteps": {
+            "mock_step1": "succeeded",
+            "mock_step2.start": "succeeded",
+            "mock_step3": "succeeded",
+            "mock_step4.start": "succeeded",
+            "mock_step5": "succeeded",
+            "mock_step6": "succeeded",
+            "mock_step4.stop": "succeeded",
+            "mock_step2.stop": "succeeded",
+        },
+    },
+}
+
+
+@pytest.mark.parametrize("scenario", list(LIFECYCLE_SCENARIOS))
+async def test_blueprint_lifecycle(
+    scenario,
+    bootsteps_graph,
+    mock_execution_order_strategy_class,
+    m,
+    wired_execution_order,
+    logger,
 ):
-    mock_step1 = create_mock_step("step1")
-    mock_step2 = create_start_stop_mock_step("step2")
-    mock_step3 = create_mock_step("step3")
-    mock_step4 = create_start_stop_mock_step("step4", mock_class=TrioCoroutineMock)
-    mock_step4.stop.side_effect = expected_exception = RuntimeError("Expected Failure")
-    mock_step5 = create_mock_step("step5")
-    mock_step6 = create_mock_step("step6", spec=AsyncStep, mock_class=TrioCoroutineMock)
+    scenario = LIFECYCLE_SCENARIOS[scenario]
 
-    # We're using a parent mock simply to record the order of calls to different
-    # steps
-    m = Mock()
-    m.attach_mock(mock_step1, "mock_step1")
-    m.attach_mock(mock_step2, "mock_step2")
-    m.attach_mock(mock_step3, "mock_step3")
-    m.attach_mock(mock_step4, "mock_step4")
-    m.attach_mock(mock_step5, "mock_step5")
-    m.attach_mock(mock_step6, "mock_step6")
+    def bootstep(path):
+        return attrgetter(path)(m)
 
-    expected_execution_order = [
-        [m.mock_step1, m.mock_step2],
-        [m.mock_step3, m.mock_step4, m.mock_step5],
-        [m.mock_step6],
+    expected_exception = None
+    if scenario["failing_bootstep"]:
+        expected_exception = RuntimeError("Expected Failure")
+        bootstep(scenario["failing_bootstep"]).side_effect = expected_exception
+
+    expected_states = [
+        [
+            (state, expected_exception) if state == BlueprintState.FAILED else state
+            for state in states
+        ]
+        for states in scenario["expected_states"]
     ]
-    mock_iterator = MagicMock()
-    mock_iterator.__iter__.return_value = expected_execution_order
-    reversed_func = Mock(return_value=reversed(expected_execution_order))
-    mock_iterator.__reversed__ = reversed_func
-    mock_execution_order_strategy_class.return_value = mock_iterator
 
     blueprint = Blueprint(
         bootsteps_graph,
         name="Test",
         execution_order_strategy_class=mock_execution_order_strategy_class,
     )
-
-    with pytest.raises(RuntimeError):
+    state_changes = blueprint.state_changes_receive_channel
+
+    if scenario["entry_point"] == "async_context_manager":
+        running_states, terminating_states = expected_states
+        async with blueprint:
+            await assert_state_sequence(state_changes, *running_states)
+
+        await assert_state_sequence(state_changes, *terminating_states)
+    elif expected_exception:
+        (states,) = expected_states
+        with pytest.raises(RuntimeError):
+            async with trio.open_nursery() as nursery:
+                nursery.start_soon(getattr(blueprint, scenario["entry_point"]))
+
+        await assert_state_sequence(state_changes, *states)
+    else:
+        (states,) = expected_states
         async with trio.open_nursery() as nursery:
-            nursery.start_soon(blueprint.stop)
+            nursery.start_soon(getattr(blueprint, scenario["entry_point"]))
 
-    with trio.fail_after(1):
-        assert (
-            await blueprint.state_changes_receive_channel.receive()
-            == BlueprintState.TERMINATING
-        )
-
-    with trio.fail_after(1):
-        assert await blueprint.state_changes_receive_channel.receive() == (
-            BlueprintState.FAILED,
-            expected_exception,
-        )
+            await assert_state_sequence(state_changes, *states)
 
     mock_execution_order_strategy_class.assert_called_once_with(blueprint._steps)
 
-    assert_parallelized_steps_are_in_order(m.method_calls, [[call.mock_step4.stop()]])
+    assert_parallelized_steps_are_in_order(m.method_calls, scenario["expected_calls"])
+
+    for path in scenario["awaited_bootsteps"]:
+        bootstep(path).assert_awaited_once_with()
 
-    mock_step1.assert_not_called()
-    mock_step2.stop.assert_not_called()
-    mock_step3.assert_not_called()
-    mock_step5.assert_not_called()
-    mock_step6.assert_not_called()
+    for path in scenario["not_called_bootsteps"]:
+        bootstep(path).assert_not_called()
 
-    logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:stop")
-    assert len(logged_actions) == 1
-    logged_action = logged_actions[0]
-    assert_log_message_field_equals(logged_action.start_message, "name", blueprint.name)
-    assert_logged_action_failed(logged_action)
+    for logged_action_type in scenario["logged_action_types"]:
+        logged_actions = LoggedAction.of_type(logger.messages, logged_action_type)
+        assert len(logged_actions) == 1
+        logged_action = logged_actions[0]
+        assert_log_message_field_equals(logged_action.start_message, "name", blueprint.name)
+        if expected_exception:
+            assert_logged_action_failed(logged_action)
+        else:
+            assert_logged_action_succeeded(logged_action)
 
     messages = LoggedMessage.of_type(
         logger.messages, "bootsteps:blueprint:next_bootsteps"
     )
-    assert len(messages) == 1, messages
+    assert len(messages) == len(scenario["next_bootsteps"]), messages
 
-    assert_log_message_field_equals(messages[0].message, "name", blueprint.name)
-    assert_log_message_field_equals(
-        messages[0].message, "next_bootsteps", [m.mock_step4]
-    )
+    for message, next_bootsteps in zip(messages, scenario["next_bootsteps"]):
+        assert_log_message_field_equals(message.message, "name", blueprint.name)
+        assert_log_message_field_equals(
+            message.message, "next_bootsteps", [bootstep(path) for path in next_bootsteps]
+        )
 
     logged_actions = LoggedAction.of_type(logger.messages, "bootsteps:blueprint:executing_bootstep")
-    assert len(logged_actions) == 1
-
-    start_messages = [logged_action.start_message for logged_action in logged_actions]
-
-    assert_field_equals_in_any_message(start_messages, "bootstep", m.mock_step4.stop)
-
-    assert_logged_action_failed(logged_actions[0])
-
-
-async def test_blueprint_async_context_manager(
-    bootsteps_graph, mock_execution_order_strategy_class
-):
-    mock_step1 = create_mock_step("step1")
-    mock_step2 = create_start_stop_mock_step("step2")
-    mock_step3 = create_mock_step("step3")
-    mock_step4 = create_start_stop_mock_step("step4", mock_class=TrioCoroutineMock)
-    mock_step5 = create_mock_step("step5")
-    mock_step6 = create_mock_step("step6", spec=AsyncStep, mock_class=TrioCoroutineMock)
-
-    # We're using a parent mock simply to record the order of calls to different
-    # steps
-    m = Mock()
-    m.attach_mock(mock_step1, "mock_step1")
-    m.attach_mock(mock_step2, "mock_step2")
-    m.attach_mock(mock_step3, "mock_step3")
-    m.attach_mock(mock_step4, "mock_step4")
-    m.attach_mock(mock_step5, "mock_step5")
-    m.attach_mock(mock_step6, "mock_step6")
-
-    expected_execution_order = [
-        [m.mock_step1, m.mock_step2],
-        [m.mock_step3, m.mock_step4, m.mock_step5],
-        [m.mock_step6],
-    ]
-    mock_iterator = MagicMock()
-    reversed_func = Mock(return_value=reversed(expected_execution_order))
-    mock_iterator.__reversed__ = reversed_func
-    mock_iterator.__iter__.return_value = expected_execution_order
-    mock_execution_order_strategy_class.return_value = mock_iterator
-
-    blueprint = Blueprint(
-        bootsteps_graph,
-        name="Test",
-        execution_order_strategy_class=mock_execution_order_strategy_class,
-    )
-
-    async with blueprint:
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.RUNNING
-            )
-        with trio.fail_after(1):
-            assert (
-                await blueprint.state_changes_receive_channel.receive()
-                == BlueprintState.COMPLETED
-            )
-
-    with trio.fail_after(1):
-        assert (
-            await blueprint.state_changes_receive_channel.receive()
-            == BlueprintState.TERMINATING
+    assert len(logged_actions) == len(scenario["executed_bootsteps"])
+
+    # Steps which run in parallel may be logged in any order
+    for path, action_status in scenario["executed_bootsteps"].items():
+        matching_actions = [
+            logged_action
+            for logged_action in logged_actions
+            if logged_action.start_message["bootstep"] == bootstep(path)
+        ]
+        assert len(matching_actions) == 1, matching_actions
+        (logged_action,) = matching_actions
+        assert_log_message_field_equals(
+            logged_action.end_message, "action_status", action_status
         )
-    with trio.fail_after(1):
-        assert (
-            await blueprint.state_changes_receive_channel.receive()
-            == BlueprintState.TERMINATED
-        )
-
-    assert_parallelized_steps_are_in_order(
-        m.method_calls,
-        [
-            [call.mock_step1(), call.mock_step2.start()],
-            [call.mock_step3(), call.mock_step4.start(), call.mock_step5()],
-            [call.mock_step6()],
-            [call.mock_step4.stop()],
-            [call.mock_step2.stop()],
-        ],
-    )
-
-    mock_step6.assert_awaited_once_with()
-    mock_step4.start.assert_awaited_once_with()
-    mock_step4.stop.assert_awaited_once_with()
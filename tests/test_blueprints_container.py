@@ -9,7 +9,7 @@ from tests.assertions import (
     assert_logged_action_failed,
     assert_logged_action_succeeded,
 )
-from tests.mocks import TrioCoroutineMock, create_mock_step, create_start_stop_mock_step
+from tests.mocks import create_mock_step, create_start_stop_mock_step
 
 
 def test_blueprint_container_dependencies_graph(logger):